@@ -1,11 +1,43 @@
+import hashlib
+import inspect
 import math
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 import pandas as pd
 from scipy.optimize import curve_fit as cf
+from pathlib import Path
+from typing import Final
 import numpy as np
 
-# Create global variables
-global psf2pa
-psf2pa = 0.020885 # Conversion factor for psf --> Pa
+# Names exported by 'from dataFunctions import *'
+__all__ = [
+    'psf2pa', 'lbf2N', 'inlbs2Nm',
+    'Data', 'read_files', 'q2v', 'force2coeff', 'moment2coeff', 'NA2LD',
+    'na_to_cld', 'moment_transfer', 'linear', 'get_linear_curve', 'quadratic',
+    'get_quadratic_curve', 'cubic', 'get_cubic_curve', 'calibrate_curve',
+    'data_split',
+]
+
+# Module constants
+psf2pa: Final[float] = 0.020885       # Conversion factor for psf --> Pa
+lbf2N: Final[float] = 4.44822         # Conversion for lbf to N
+inlbs2Nm: Final[float] = 0.1129848333 # Conversion for in*lbf to N*m
+
+BALANCE_A: Final[float] = 28.829/1000 # m
+BALANCE_D: Final[float] = 71.04/1000  # m
+BALANCE_AD: Final[float] = BALANCE_A + BALANCE_D # Moment arm is BALANCE_AD - b
+
+T_AMB: Final[float] = 296.15 # K (Found from National Weather Service website)
+P_AMB: Final[float] = 100914 # Pa (Also found from NWS site)
+R_AIR: Final[float] = 287    # J*kg^-1*K^-1 (Specific gas constant for air)
+
+# Folded constant for q2v: v = sqrt(2*|q/psf2pa|*R_AIR*T_AMB/P_AMB)
+Q2V_K: Final[float] = 2*R_AIR*T_AMB/(P_AMB*psf2pa)
+
+CACHE_VERSION: Final[int] = 1 # Bump when read_files output format changes
 
 # ------------------------------------------------------------------------------
 # ---------------------------- Classes & Functions -----------------------------
@@ -13,109 +45,177 @@ psf2pa = 0.020885 # Conversion factor for psf --> Pa
 
 # Create object in order to call specific property of data rather than use messy
 # and confusing list formatting
+@dataclass(slots=True)
 class Data:
-    def __init__(self, alphaVel, normalForce, axialForce, pitchingMoment,
-                 coefficientLift, coefficientDrag, coefficientMoment):
-        self.X = alphaVel # Either AoA or v_inf
-        self.NF = normalForce
-        self.AF = axialForce
-        self.PM = pitchingMoment
-        self.CL = coefficientLift
-        self.CD = coefficientDrag
-        self.CM = coefficientMoment
+    X: np.ndarray  # Either AoA or v_inf
+    NF: np.ndarray # Normal Force
+    AF: np.ndarray # Axial Force
+    PM: np.ndarray # Pitching Moment
+    CL: np.ndarray # Coefficient of Lift
+    CD: np.ndarray # Coefficient of Drag
+    CM: np.ndarray # Coefficient of Pitching Moment
+
+    def __post_init__(self):
+        # Store every property as a contiguous float array so downstream
+        # NumPy/SciPy calls all take the same path.
+        for f in fields(self):
+            setattr(self, f.name, np.ascontiguousarray(getattr(self, f.name),
+                                                       dtype=np.float64))
 
 def read_files(files:list[str]):
     '''This function reads .csv a list of files and turns it into a list of 
-    pandas dataframes'''
+    arrays with columns: Alpha, NF/SF, AF/AF2, PM/YM, q'''
     
-    n = len(files)
-    new_files = [0]*n
     rows = [0,1,2,3,4,5,6,8] # Skips these rows when reading csv files
-
-    # Iterate through list of strings to read .csv files
-    for i in range(0,n):
-        new_files[i] = pd.read_csv(files[i], skiprows=rows)
+    cols = ['Alpha', 'NF/SF', 'AF/AF2', 'PM/YM', 'q'] # Only columns used
+
+    def read(f):
+        df = pd.read_csv(f, skiprows=rows, engine='c', usecols=cols,
+                         dtype=np.float64)
+        return df[cols].to_numpy(dtype=np.float64, copy=False)
+
+    # Parsed arrays are cached as .npz, keyed by the read settings and file
+    # paths + modified times, so repeat runs skip CSV parsing until a file or
+    # the way it is read changes. Cache names start with a hash of the file
+    # list, so each set of files keeps its own entry.
+    def blake(obj):
+        return hashlib.blake2b(repr(obj).encode(), digest_size=8).hexdigest()
+
+    key = (CACHE_VERSION, rows, cols,
+           tuple((f, os.path.getmtime(f)) for f in files))
+    prefix = blake(tuple(files))
+    cache_dir = Path(__file__).parent/'cache'
+    cache = cache_dir/f'{prefix}-{blake(key)}.npz'
+
+    try:
+        with np.load(cache) as npz:
+            return [npz[f'a{i}'] for i in range(len(files))]
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        pass # Missing or unreadable cache, parse the CSVs instead
+
+    # Read files concurrently; the C parser releases the GIL while parsing
+    with ThreadPoolExecutor() as executor:
+        new_files = list(executor.map(read, files))
+
+    # Caching is best-effort: write to a temp file and move it into place so
+    # an interrupted run never leaves a truncated .npz, then remove older
+    # entries for the same file list and temp files left by killed runs.
+    # Failures (i.e. read-only checkout) are ignored.
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez(fh, **{f'a{i}': a for i, a in enumerate(new_files)})
+            os.replace(tmp, cache)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        for old in cache_dir.glob(f'{prefix}-*.npz'):
+            if old != cache:
+                old.unlink()
+        for old in cache_dir.glob('*.tmp'):
+            old.unlink(missing_ok=True)
+    except OSError:
+        pass
 
     return new_files
 
-def q2v(q:list[int]):
+def q2v(q:np.ndarray):
     '''This function uses the ideal gas law and the dynamic pressure equation
     in order to convert dynamic pressure into wind velocity'''
-    T = 296.15        # K (Found from National Weather Service website)
-    p = 100914        # Pa (Also found from NWS site)
-    R = 287           # J*kg^-1*K^-1 (Specific gas constant for air)
-    
-    n = len(q)
-    vel = [0]*n
-    for i in range(0,n):
-        # use absolute value of q so as not to get a domain error w/ sqrt
-        vel[i] = math.sqrt((2*abs(q[i]/psf2pa)*R*T)/p)
-    
-    return vel
+    q = np.asarray(q, dtype=np.float64)
+
+    # use absolute value of q so as not to get a domain error w/ sqrt
+    return np.sqrt(Q2V_K*np.abs(q))
 
-def force2coeff(force:list[int], q:list[int], S:int):
+def force2coeff(force:np.ndarray, q:np.ndarray, S:float):
     '''This function converts force into its corresponding coefficients 
     (i.e, lift force --> coefficient of lift)'''
-    n = len(force)
-    coefficient = [0]*n # Initializing list
+    force = np.asarray(force, dtype=np.float64)
+    denom = np.asarray(q, dtype=np.float64)*S
+
+    # Leaves NaN where q = 0, so as not to divide by 0.
+    coefficient = np.full(force.shape, np.nan)
+    np.divide(force, denom, out=coefficient, where=denom != 0.0)
 
-    # Iterate through force & q in order to find coefficients.
-    for i in range(0,n):
-        if q[i] == 0: # Skips when q = 0, so as not to divide by 0.
-            coefficient[i] = None
-        else:
-            coefficient[i] = force[i]/(q[i]*S)
-        
     return coefficient
 
-def moment2coeff(moment:list[int], q:list[int],S:int, d:int):
+def moment2coeff(moment:np.ndarray, q:np.ndarray, S:float, d:float):
     '''This functions converts pitching moment into its corresponding pitching
     moment coefficient.'''
-    
-    n = len(moment)
-    coefficient = [0]*n # Initializing list
-    
-    # Iterate through moments 
-    for i in range(0,n):
-        if q[i] == 0:
-            coefficient[i] = None
-        else:
-            coefficient [i] = moment[i]/(q[i]*S*d)
+    moment = np.asarray(moment, dtype=np.float64)
+    denom = np.asarray(q, dtype=np.float64)*S*d
+
+    # Leaves NaN where q = 0, so as not to divide by 0.
+    coefficient = np.full(moment.shape, np.nan)
+    np.divide(moment, denom, out=coefficient, where=denom != 0.0)
 
     return coefficient
 
-def NA2LD(N:list[int], A:list[int], alphaDeg:list[int]):
+def NA2LD(N:np.ndarray, A:np.ndarray, alphaDeg:np.ndarray):
     '''This function takes normal/axial force and angle of attack and converts
     it into lift/drag force'''
-    
-    n = len(N)
+    N = np.asarray(N, dtype=np.float64)
+    A = np.asarray(A, dtype=np.float64)
+    alphaRad = np.deg2rad(np.asarray(alphaDeg, dtype=np.float64))
 
-    # Initialize lists
-    liftForce = [0]*n
-    dragForce = [0]*n
-    alphaRad = [0]*n
-
-    # Iterate through list to convert to lift force for corresponding
-    # normal/axial forces + AoA.
-    for i in range(0,n):
-        alphaRad[i] = math.radians(alphaDeg[i]) # Convert AoA into radians
-        liftForce[i] = N[i]*math.cos(alphaRad[i]) - A[i]*math.sin(alphaRad[i])
-        dragForce[i] = N[i]*math.sin(alphaRad[i]) + A[i]*math.cos(alphaRad[i])
+    # Rotate normal/axial forces by AoA to get lift/drag forces.
+    c = np.cos(alphaRad)
+    s = np.sin(alphaRad)
+    liftForce = N*c - A*s
+    dragForce = N*s + A*c
 
     return liftForce, dragForce
 
-def moment_transfer(moment:list[int], normal:list[int], b:list[int]):
-    A = 28.829/1000 # m
-    D = 71.04/1000 # m
-    n = len(moment)
-    C = D-b    
+def na_to_cld(N:np.ndarray, A:np.ndarray, alphaDeg:np.ndarray, q:np.ndarray,
+              S:float):
+    '''This function fuses NA2LD and force2coeff, taking normal/axial force,
+    angle of attack and dynamic pressure straight to lift/drag coefficients
+    in a single pass. It is plain Python so it is only worth calling once
+    compiled by kernels_build.py, which data_split uses when built.'''
+    n = N.size
+    CL = np.empty_like(N)
+    CD = np.empty_like(N)
+
+    for i in range(n):
+        alphaRad = alphaDeg[i]*0.017453292519943295 # pi/180
+        c = math.cos(alphaRad)
+        s = math.sin(alphaRad)
+        denom = q[i]*S
+        if denom != 0: # Leaves NaN where q = 0, so as not to divide by 0.
+            CL[i] = (N[i]*c - A[i]*s)/denom
+            CD[i] = (N[i]*s + A[i]*c)/denom
+        else:
+            CL[i] = np.nan
+            CD[i] = np.nan
 
-    new_moment = [0]*n
-    
-    for i in range(0,n):
-        new_moment[i] = moment[i] - (A + C)*normal[i]
-        
-    return new_moment
+    return CL, CD
+
+def kernel_source_hash():
+    '''This function hashes the source of na_to_cld into an int64, so a
+    kernel built by kernels_build.py can be checked against the current code'''
+    src = inspect.getsource(na_to_cld).encode()
+    digest = hashlib.blake2b(src, digest_size=7).digest()
+    return int.from_bytes(digest, 'little')
+
+# Use the ahead-of-time compiled na_to_cld if it has been built with
+# kernels_build.py from the current source. Otherwise (not built, or na_to_cld
+# edited since) data_split uses the NumPy path.
+try:
+    import aero_kernels
+    if aero_kernels.source_hash() != kernel_source_hash():
+        aero_kernels = None
+except (ImportError, AttributeError):
+    aero_kernels = None
+
+def moment_transfer(moment:np.ndarray, normal:np.ndarray, b:float):
+    k = BALANCE_AD - b # Moment arm between balance center and model
+
+    moment = np.asarray(moment, dtype=np.float64)
+    normal = np.asarray(normal, dtype=np.float64)
+
+    return moment - k*normal
 
 def linear(x, a, b):
     return a*x + b
@@ -167,7 +267,7 @@ def calibrate_curve(x, a1, a2, b1, b2):
     return [x_line, y_line]
 
 def data_split(data:list):
-    '''This function splits dataframe into: Alpha/Velocity, Normal Force,
+    '''This function splits each data array into: Alpha/Velocity, Normal Force,
     Axial Force, and Pitching Moment. Also converts forces into metric.'''
     
     diameters = [ # Diameters in mm
@@ -201,41 +301,51 @@ def data_split(data:list):
     S[:] = [x/(1000**2) for x in S] # Convert to m^2
     B[:] = [x/1000 for x in B] # Convert to m
 
-    lbf2N = 4.44822         # Conversion for lbf to N
-    inlbs2Nm = 0.1129848333 # Conversion for in*lbf to N*m
     n = len(data)
 
+    # Scale each column once per dataset rather than at every use.
+    # Columns: 0 = Alpha, 1 = NF/SF, 2 = AF/AF2, 3 = PM/YM, 4 = q
+    nf0 = data[0][:, 1]*lbf2N
+    af0 = data[0][:, 2]*lbf2N
+    q0 = data[0][:, 4]/psf2pa
+    nf1 = data[1][:, 1]*lbf2N
+    af1 = data[1][:, 2]*lbf2N
+    q1 = data[1][:, 4]/psf2pa
+
     # Find lifting force and drag force based on AoA and normal/axial forces.
-    # Only for flat plate angle
-    lF0, dF0 = NA2LD(data[0]['NF/SF']*lbf2N, data[0]['AF/AF2']*lbf2N,
-                   data[0]['Alpha'])
-    lF, dF = NA2LD(data[1]['NF/SF']*lbf2N, data[1]['AF/AF2']*lbf2N,
-                   data[1]['Alpha'])
+    # Only for flat plate angle. Zero velocity set only needs the coefficients,
+    # so the compiled kernel (if built) goes straight to CL/CD.
+    if aero_kernels is not None:
+        cL0, cD0 = aero_kernels.na_to_cld(nf0, af0, data[0][:, 0], q0, S[0])
+    else:
+        lF0, dF0 = NA2LD(nf0, af0, data[0][:, 0])
+        cL0, cD0 = force2coeff(lF0, q0, S[0]), force2coeff(dF0, q0, S[0])
+    lF, dF = NA2LD(nf1, af1, data[1][:, 0])
     
     # Separate Flat Plate Angle from other data, since x axis will be AoA
     # rather than wind velocity.
     
     list = [0]*n
     list[0] = Data(
-        data[0]['Alpha'],
-        data[0]['NF/SF']*lbf2N,
-        data[0]['AF/AF2']*lbf2N,
-        data[0]['PM/YM']*inlbs2Nm,
-        force2coeff(lF0, data[0]['q']/psf2pa, S[0]),
-        force2coeff(dF0, data[0]['q']/psf2pa, S[0]),
-        moment2coeff(data[0]['PM/YM'], data[0]['q'], S[0], diameters[0])
+        data[0][:, 0],
+        nf0,
+        af0,
+        data[0][:, 3]*inlbs2Nm,
+        cL0,
+        cD0,
+        moment2coeff(data[0][:, 3], data[0][:, 4], S[0], diameters[0])
     )
     
     list[0].PM = moment_transfer(list[0].PM, list[0].NF, B[0])
 
     list[1] = Data(
-        data[1]['Alpha'],
-        data[1]['NF/SF']*lbf2N,
-        data[1]['AF/AF2']*lbf2N,
-        data[1]['PM/YM']*inlbs2Nm,
-        force2coeff(lF, data[1]['q']/psf2pa, S[1]),
-        force2coeff(dF, data[1]['q']/psf2pa, S[1]),
-        moment2coeff(data[1]['PM/YM'], data[1]['q'], S[1], diameters[1])
+        data[1][:, 0],
+        nf1,
+        af1,
+        data[1][:, 3]*inlbs2Nm,
+        force2coeff(lF, q1, S[1]),
+        force2coeff(dF, q1, S[1]),
+        moment2coeff(data[1][:, 3], data[1][:, 4], S[1], diameters[1])
     )
     
     list[1].PM = moment_transfer(list[1].PM, list[1].NF, B[1])
@@ -243,14 +353,17 @@ def data_split(data:list):
     # Iterate through data to split for each shape and assign different types of
     # data to object properties.
     for i in range(2,n):
+        nf = data[i][:, 1]*lbf2N
+        af = data[i][:, 2]*lbf2N
+        qv = data[i][:, 4]/psf2pa
         list[i] = Data( # Assume NF/AF == LF/DF since AoA = 0
-            q2v(data[i]['q']),         # convert 'q' column into v_inf
-            data[i]['NF/SF']*lbf2N,    # Normal Force
-            data[i]['AF/AF2']*lbf2N,   # Axial Force
-            data[i]['PM/YM']*inlbs2Nm, # Pitching Moment
-            force2coeff(data[i]['NF/SF']*lbf2N, data[i]['q']/psf2pa, S[i]),
-            force2coeff(data[i]['AF/AF2']*lbf2N, data[i]['q']/psf2pa, S[i]),
-            moment2coeff(data[i]['PM/YM'], data[i]['q'], S[i], diameters[i])
+            q2v(data[i][:, 4]),        # convert 'q' column into v_inf
+            nf,                        # Normal Force
+            af,                        # Axial Force
+            data[i][:, 3]*inlbs2Nm,    # Pitching Moment
+            force2coeff(nf, qv, S[i]),
+            force2coeff(af, qv, S[i]),
+            moment2coeff(data[i][:, 3], data[i][:, 4], S[i], diameters[i])
         )   
         list[i].PM = moment_transfer(list[i].PM, list[i].NF, B[i])
 
@@ -1,6 +1,16 @@
+import os
+import sys
+import matplotlib
+
+# Use non-interactive backend when run headless (batch runs, CI, redirected
+# output) and save figures to figures/*.png instead of showing them.
+HEADLESS = (sys.stdout is None or not sys.stdout.isatty()
+            or os.environ.get('HEADLESS', '').lower() not in ('', '0', 'false'))
+if HEADLESS:
+    matplotlib.use('Agg')
+
 import matplotlib.pyplot as plt
 from pathlib import Path
-from scipy.signal import savgol_filter as sf
 from dataFunctions import *
 
 # ------------------------------------------------------------------------------
@@ -561,4 +571,11 @@ ax9.set_xlim(xmin=0, xmax=23)
 ax9.grid()
 ax9_2.set_xlim(xmin=0, xmax=23)
 ax9_2.grid()
-plt.show()
\ No newline at end of file
+
+if HEADLESS:
+    out = Path(__file__).parent/'figures' # Saved next to the script
+    out.mkdir(exist_ok=True)
+    for i in plt.get_fignums():
+        plt.figure(i).savefig(out/f'fig{i}.png', dpi=100)
+else:
+    plt.show()
@@ -0,0 +1,26 @@
+from pathlib import Path
+from numba.pycc import CC
+from dataFunctions import na_to_cld, kernel_source_hash
+
+# ------------------------------------------------------------------------------
+# Ahead-of-time compilation of the numeric kernels. Run once with
+#     python kernels_build.py
+# to build the aero_kernels extension next to this file. Numba is only needed
+# here, at build time. Re-run after editing na_to_cld.
+# ------------------------------------------------------------------------------
+
+SOURCE_HASH = kernel_source_hash()
+
+cc = CC('aero_kernels')
+cc.output_dir = str(Path(__file__).parent)
+
+cc.export('na_to_cld', 'UniTuple(f8[:], 2)(f8[:], f8[:], f8[:], f8[:], f8)')(
+    na_to_cld
+)
+
+@cc.export('source_hash', 'i8()')
+def source_hash():
+    return SOURCE_HASH
+
+if __name__ == '__main__':
+    cc.compile()